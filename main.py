@@ -1,24 +1,58 @@
 import sys
 import json
 import base64
+import functools
+import hashlib
+import multiprocessing
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from typing import List
+from typing import Final, List
 
 # PyQt5 界面库
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QTextEdit, QLabel, 
-                             QFileDialog, QListWidget, QSplitter, QProgressBar,
-                             QLineEdit, QFormLayout, QMessageBox, QTabWidget)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+                             QFileDialog, QListWidget, QListWidgetItem,
+                             QSplitter, QProgressBar,
+                             QLineEdit, QFormLayout, QMessageBox, QTabWidget,
+                             QAction)
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 
 # 图片与PDF处理
-from PIL import Image
-from pdf2image import convert_from_path
+from PIL import Image, ImageStat
+import fitz  # PyMuPDF：进程内渲染PDF，无需外置Poppler
 
 # AI 模型接口
-from openai import OpenAI
+import httpx
+from openai import OpenAI, APIError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+# base64 编码：优先 pybase64 (SIMD实现，快~10倍)，未安装则退回标准库
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# JSON 解析：优先 orjson (Rust实现，快2~5倍)，未安装则退回标准库
+try:
+    import orjson
+
+    def _json_loads(s):
+        return orjson.loads(s)
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+except ImportError:
+    def _json_loads(s):
+        return json.loads(s)
+
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+# HTML 渲染模板
+import jinja2
 
 # Word 导出库
 from docx import Document
@@ -27,29 +61,75 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn  # 关键：修复字体设置报错
 
 # ==========================================
-# 工具函数：处理 Poppler 路径 (跨平台打包关键)
+# 本地结果缓存：同一图片+模型+Prompt 不重复调用API
+# ==========================================
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".essay_grader_cache")
+
+# ==========================================
+# API 客户端 (全局复用，避免每个文件重建TLS连接)
 # ==========================================
-def get_poppler_path():
-    """
-    智能获取 Poppler 路径：
-    1. Linux/Mac: 返回 None (假设系统已安装 poppler-utils)
-    2. Windows (打包后): 返回临时目录下的 poppler/bin
-    3. Windows (开发中): 返回当前目录下的 poppler/bin
-    """
-    if sys.platform != "win32":
-        return None  # Linux 环境通常不需要指定路径，只要安装了 poppler-utils
-    
-    # 获取基础路径：如果是 exe 运行则是临时目录 _MEIPASS，否则是当前脚本目录
-    base_path = getattr(sys, '_MEIPASS', os.path.abspath("."))
-    
-    # 构造 poppler/bin 的绝对路径
-    # 注意：这要求打包时使用了 --add-data "poppler;poppler"
-    return os.path.join(base_path, 'poppler', 'bin')
+API_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3"
+
+@functools.lru_cache(maxsize=4)
+def _get_client(api_key, base_url=API_BASE_URL):
+    """按 (api_key, base_url) 复用同一客户端，并发Worker共享一个连接池"""
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16)
+        ),
+    )
+
+# ==========================================
+# 深度精批页模板 (模块级编译一次; autoescape 防止模型文本破坏HTML)
+# ==========================================
+_FEEDBACK_TMPL = jinja2.Template("""
+<h2 style='color:#333'>总分：<span style='color:#E53935; font-size:24px'>{{ scores.get('total') }}/15</span></h2>
+
+<table border='1' cellpadding='6' cellspacing='0' style='border-collapse:collapse; width:100%; border-color:#ddd;'>
+    <tr style='background-color:#f5f5f5'>
+        <th width='33%'>内容要点</th><th width='33%'>语言表达</th><th width='33%'>结构衔接</th>
+    </tr>
+    <tr>
+        <td align='center'>{{ scores.get('dim1_score') }}/5</td>
+        <td align='center'>{{ scores.get('dim2_score') }}/5</td>
+        <td align='center'>{{ scores.get('dim3_score') }}/5</td>
+    </tr>
+</table>
+
+<h3 style='background-color:#E3F2FD; padding:5px'>一、内容要点</h3>
+<ul>
+    <li><b>🔻 不足：</b> {{ content_fb.get('weakness', '无') }}</li>
+    <li><b>💡 建议：</b> {{ content_fb.get('suggestion', '无') }}</li>
+</ul>
+
+<h3 style='background-color:#FFF3E0; padding:5px'>二、语言表达 (逐句精改)</h3>
+{% for item in corrections %}
+<div style='margin-bottom:15px; border-bottom:1px dashed #ccc; padding-bottom:10px;'>
+    <p style='margin:4px 0'><b>{{ loop.index }}. 🔴 原句：</b> <span style='color:#555'>{{ item.get('original') }}</span></p>
+    <p style='margin:4px 0'><b>🟢 修改：</b> <span style='color:#2E7D32; font-weight:bold'>{{ item.get('revised') }}</span></p>
+    <p style='margin:4px 0; color:#1565C0'><b>📘 解析：</b> {{ item.get('explanation') }}</p>
+</div>
+{% else %}
+<p>暂无具体句子修改建议。</p>
+{% endfor %}
+
+<p><b>整体评价：</b> {{ lang_fb.get('general_comment', '') }}</p>
+
+<h3 style='background-color:#E8F5E9; padding:5px'>三、结构与衔接</h3>
+<p>{{ fb.get('structure', '无') }}</p>
+
+<hr>
+<p><b>🌟 整体总结：</b> {{ fb.get('overall_summary', '') }}</p>
+""", autoescape=True)
 
 # ==========================================
 # 评分标准 Prompt (JSON 结构化输出)
+# 注意：必须作为首条 system 消息原样发送且逐字节一致——
+# 供应商侧的前缀缓存(KV-cache)依赖这一点降低每次请求的TTFT和计费
 # ==========================================
-RUBRIC_PROMPT = """
+RUBRIC_PROMPT: Final[str] = """
 你是一位资深的高考英语阅卷专家。请对上传的手写英语作文图片进行识别、分类、评分，并提供极度详细的逐句修改意见。
 
 ### 任务步骤：
@@ -94,101 +174,308 @@ RUBRIC_PROMPT = """
     },
     "revised_version": "Full revised essay..."
 }
-"""
+""".strip()
+
+# Markdown 代码围栏清理 (JSON模式下通常不出现，留作兜底)
+_MD_RE = re.compile(r"```(?:json)?\s*|\s*```")
 
 # ==========================================
-# 后端工作线程
+# 图片预处理 (模块级函数，可被子进程 pickle 调用)
 # ==========================================
-class Worker(QThread):
-    finished = pyqtSignal(dict, str) # 返回结果JSON和文件路径
-    error = pyqtSignal(str, str)     # 返回错误信息和文件路径
+def encode_image(image_path):
+    """处理图片/PDF转Base64"""
+    img = None
+    ext = os.path.splitext(image_path)[1].lower()
+    # 1600px 长边是视觉模型OCR的甜点位，再大只增加延迟和费用
+    max_size = 1600
+
+    try:
+        # 0. 已达标的小JPEG直接透传原始字节：免去解码->缩放->再编码，
+        #    也避免一次无谓的有损重压
+        if ext in ('.jpg', '.jpeg'):
+            with open(image_path, 'rb') as f:
+                raw = f.read()
+            if len(raw) < 1_500_000:
+                w, h = Image.open(BytesIO(raw)).size  # 只读文件头，不解码像素
+                if max(w, h) <= max_size:
+                    return _b64.b64encode(raw).decode('ascii')
+
+        # 1. 处理 PDF (只渲染第一页)
+        if ext == '.pdf':
+            try:
+                doc = fitz.open(image_path)
+                # Matrix(2,2) ≈ 144dpi，对手写体OCR足够清晰
+                pix = doc.load_page(0).get_pixmap(matrix=fitz.Matrix(2, 2))
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                doc.close()
+            except Exception as e:
+                raise Exception(f"PDF处理失败: {str(e)}")
+        
+        # 2. 处理图片
+        else:
+            img = Image.open(image_path)
+            # JPEG 可让 libjpeg 在解码阶段就按 1/2、1/4、1/8 降采样，
+            # 大图(手机照片)解码快数倍，后续 thumbnail 做最终缩放
+            if ext in ('.jpg', '.jpeg'):
+                img.draft('RGB', (max_size, max_size))
+
+        if img is None: raise Exception("无法加载文件内容")
+
+        # 3. 格式统一化
+        if img.mode in ("RGBA", "P"):
+            img = img.convert("RGB")
+        
+        # 缩放限制：超大图先用BOX快速减半，再LANCZOS精缩，视觉无差但快约3倍
+        if max(img.size) > max_size * 2:
+            img = img.resize((img.width // 2, img.height // 2), Image.Resampling.BOX)
+        if max(img.size) > max_size:
+            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+        # 手写作文多为黑白纸面：三通道几乎一致时转灰度，再省~1/3字节
+        # (彩色墨迹/彩色PDF的通道差异大，会自动保留彩色)
+        if img.mode == "RGB":
+            stat = ImageStat.Stat(img)
+            if (max(stat.mean) - min(stat.mean) < 3
+                    and max(stat.stddev) - min(stat.stddev) < 3):
+                img = img.convert("L")
+
+        # optimize+progressive 可再省3~7%字节；4:2:0采样对手写体无可见差异
+        buffered = BytesIO()
+        img.save(buffered, format="JPEG", quality=82,
+                 optimize=True, progressive=True, subsampling=2)
+        # 超过1.5MB时降质重压，控制上传payload
+        if buffered.tell() > 1_500_000:
+            buffered = BytesIO()
+            img.save(buffered, format="JPEG", quality=75,
+                     optimize=True, progressive=True, subsampling=2)
+        # getbuffer() 零拷贝取出JPEG字节，避免 getvalue() 的中间副本
+        return _b64.b64encode(buffered.getbuffer()).decode('ascii')
+
+    except Exception as e:
+        raise Exception(f"图片预处理失败: {str(e)}")
 
-    def __init__(self, file_path, api_key, model_endpoint):
+# ==========================================
+# 后端工作线程 (QRunnable + 线程池并发)
+# ==========================================
+class WorkerSignals(QObject):
+    """QRunnable 本身不能带信号，用 QObject 辅助类承载"""
+    finished = pyqtSignal(dict, str)  # 返回结果JSON和文件路径
+    error = pyqtSignal(str, str)      # 返回错误信息和文件路径
+    streaming = pyqtSignal(str, str)  # 流式增量文本和文件路径
+
+class Worker(QRunnable):
+    def __init__(self, file_path, api_key, model_endpoint, process_pool=None):
         super().__init__()
+        self.signals = WorkerSignals()
         self.file_path = file_path
         self.api_key = api_key
-        self.model_endpoint = model_endpoint 
-
-    def encode_image(self, image_path):
-        """处理图片/PDF转Base64"""
-        img = None
-        ext = os.path.splitext(image_path)[1].lower()
+        self.model_endpoint = model_endpoint
+        self.process_pool = process_pool
+
+    def _cache_path(self, base64_image):
+        """缓存键 = 图片内容 + 接入点 + Prompt，任一变化都视为新请求"""
+        key = hashlib.sha256(
+            base64_image.encode() + self.model_endpoint.encode() + RUBRIC_PROMPT.encode()
+        ).hexdigest()
+        return os.path.join(CACHE_DIR, f"{key}.json")
+
+    @retry(retry=retry_if_exception_type((APIError, RateLimitError)),
+           stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=20),
+           reraise=True)
+    def _request_completion(self, client, base64_image):
+        """发起请求并消费流式返回；429/5xx 指数退避重试最多3次"""
+        response = client.chat.completions.create(
+            model=self.model_endpoint,
+            messages=[
+                {"role": "system", "content": RUBRIC_PROMPT},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "请批改这张作文图片，请严格按照JSON格式返回。"},
+                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    ]
+                }
+            ],
+            temperature=0.2, # 低随机性，保证JSON格式稳定
+            stream=True,     # 流式返回，边生成边反馈进度
+            response_format={"type": "json_object"}  # 强制合法JSON输出
+        )
+
+        parts = []
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                parts.append(delta)
+                self.signals.streaming.emit(delta, self.file_path)
+        return "".join(parts)
 
+    def run(self):
         try:
-            # 1. 处理 PDF
-            if ext == '.pdf':
+            # 解码/缩放是CPU密集活，丢给子进程池绕开GIL；无池则就地处理
+            if self.process_pool is not None:
+                base64_image = self.process_pool.submit(encode_image, self.file_path).result()
+            else:
+                base64_image = encode_image(self.file_path)
+
+            # 命中本地缓存则直接返回，不花钱不等网络
+            cache_path = self._cache_path(base64_image)
+            if os.path.exists(cache_path):
                 try:
-                    # 获取适配当前系统的 poppler 路径
-                    poppler_dir = get_poppler_path()
-                    
-                    pages = convert_from_path(
-                        image_path, 
-                        first_page=1, 
-                        last_page=1, 
-                        poppler_path=poppler_dir # 传入路径
-                    )
-                    if pages: img = pages[0]
-                except Exception as e:
-                    raise Exception(f"PDF处理失败: {str(e)}\n(如果是Windows，请检查Poppler路径配置)")
+                    with open(cache_path, 'r', encoding='utf-8') as f:
+                        self.signals.finished.emit(_json_loads(f.read()), self.file_path)
+                    return
+                except (ValueError, OSError):
+                    pass  # 缓存损坏则当作未命中，正常走API
+
+            client = _get_client(self.api_key)
+            content = self._request_completion(client, base64_image)
+            # 清理 Markdown 标记 (单趟正则代替三次全文扫描)
+            content = _MD_RE.sub("", content).strip()
             
-            # 2. 处理图片
-            else:
-                img = Image.open(image_path)
+            try:
+                result_json = _json_loads(content)
+                self._write_cache(cache_path, result_json)
+                self.signals.finished.emit(result_json, self.file_path)
+            except ValueError:
+                self.signals.error.emit(f"AI返回格式异常，无法解析 JSON。\n原始内容片段:\n{content[:200]}", self.file_path)
 
-            if img is None: raise Exception("无法加载文件内容")
+        except Exception as e:
+            self.signals.error.emit(str(e), self.file_path)
 
-            # 3. 格式统一化
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # 缩放限制
-            max_size = 2048
-            if max(img.size) > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    @staticmethod
+    def _write_cache(cache_path, result_json):
+        """原子写入：先写临时文件再 os.replace，避免半截文件"""
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(_json_dumps(result_json))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # 缓存写失败不影响主流程
 
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG", quality=85)
-            return base64.b64encode(buffered.getvalue()).decode('utf-8')
+# ==========================================
+# Word 导出线程 (lxml 序列化CPU重，移出GUI线程)
+# ==========================================
+class ExportWorker(QThread):
+    success = pyqtSignal(str)  # 返回保存路径
+    failed = pyqtSignal(str)   # 返回错误信息
 
-        except Exception as e:
-            raise Exception(f"图片预处理失败: {str(e)}")
+    def __init__(self, results_store, save_path):
+        super().__init__()
+        # 浅拷贝快照，导出期间新批改完成的文件不影响本次报告
+        self.results_store = dict(results_store)
+        self.save_path = save_path
 
     def run(self):
         try:
-            base64_image = self.encode_image(self.file_path)
+            doc = self._build_document()
+            # 原子写入：先写同目录临时文件，成功后再替换目标文件，
+            # 目标被占用/中途出错都不会留下半截docx
+            tmp_path = self.save_path + '.tmp'
+            doc.save(tmp_path)
+            os.replace(tmp_path, self.save_path)
+            self.success.emit(self.save_path)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def _build_document(self):
+        doc = Document()
+
+        # --- 核心：设置中文字体 ---
+        style = doc.styles['Normal']
+        style.font.name = 'Times New Roman'
+        style.element.rPr.rFonts.set(qn('w:eastAsia'), 'Microsoft YaHei')
+        # ------------------------
+
+        # 样式/颜色只查一次，避免每段重复走 python-docx 的样式解析
+        bullet_style = doc.styles['List Bullet']
+        color_red = RGBColor(255, 0, 0)
+        color_gray = RGBColor(100, 100, 100)
+        color_green = RGBColor(0, 128, 0)
+        color_blue = RGBColor(0, 0, 255)
+
+        def add_colored_run(p, text, rgb=None, bold=False):
+            run = p.add_run(text)
+            run.bold = bold
+            if rgb is not None:
+                run.font.color.rgb = rgb
+            return run
+
+        for file_path, data in self.results_store.items():
+            filename = os.path.basename(file_path)
             
-            client = OpenAI(
-                api_key=self.api_key,
-                base_url="https://ark.cn-beijing.volces.com/api/v3", 
-            )
-
-            response = client.chat.completions.create(
-                model=self.model_endpoint,
-                messages=[
-                    {"role": "system", "content": RUBRIC_PROMPT},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "请批改这张作文图片，请严格按照JSON格式返回。"},
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                        ]
-                    }
-                ],
-                temperature=0.2 # 低随机性，保证JSON格式稳定
-            )
-
-            content = response.choices[0].message.content
-            # 清理 Markdown 标记
-            content = content.replace("```json", "").replace("```", "").strip()
+            # 1. 标题
+            doc.add_heading(f"文件：{filename}", level=1)
             
-            try:
-                result_json = json.loads(content)
-                self.finished.emit(result_json, self.file_path)
-            except json.JSONDecodeError:
-                self.error.emit(f"AI返回格式异常，无法解析 JSON。\n原始内容片段:\n{content[:200]}", self.file_path)
+            # 2. 原文
+            doc.add_heading("OCR 识别原文", level=2)
+            p = doc.add_paragraph(data.get('recognized_text', ''))
+            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
 
-        except Exception as e:
-            self.error.emit(str(e), self.file_path)
+            # 3. 评分表
+            doc.add_heading("评分详情", level=2)
+            scores = data.get('scores', {})
+            table = doc.add_table(rows=2, cols=4)
+            table.style = 'Table Grid'
+            hdr = table.rows[0].cells
+            hdr[0].text, hdr[1].text, hdr[2].text, hdr[3].text = '维度', '内容要点', '语言表达', '结构衔接'
+            
+            row = table.rows[1].cells
+            row[0].text = '得分'
+            row[1].text = str(scores.get('dim1_score', 0))
+            row[2].text = str(scores.get('dim2_score', 0))
+            row[3].text = str(scores.get('dim3_score', 0))
+            
+            total_p = doc.add_paragraph()
+            run = add_colored_run(total_p, f"总分：{scores.get('total')}/15", color_red, bold=True)
+            run.font.size = Pt(14)
+
+            # 4. 深度反馈
+            fb = data.get('feedback_detail', {})
+            
+            # 4.1 内容
+            doc.add_heading("一、内容要点", level=3)
+            content_fb = fb.get('content', {})
+            weakness = content_fb.get('weakness') if content_fb else "无"
+            suggestion = content_fb.get('suggestion') if content_fb else "无"
+            doc.add_paragraph(f"不足：{weakness}", style=bullet_style)
+            doc.add_paragraph(f"建议：{suggestion}", style=bullet_style)
+            
+            # 4.2 语言（逐句）
+            doc.add_heading("二、语言表达与逐句修改", level=3)
+            lang_fb = fb.get('language', {})
+            corrections = lang_fb.get('sentence_corrections', []) if lang_fb else []
+            
+            if corrections:
+                for i, item in enumerate(corrections, 1):
+                    p = doc.add_paragraph()
+                    add_colored_run(p, f"{i}. 原句：", bold=True)
+                    add_colored_run(p, item.get('original', ''), color_gray)
+
+                    p = doc.add_paragraph()
+                    add_colored_run(p, f"   修改：", bold=True)
+                    add_colored_run(p, item.get('revised', ''), color_green, bold=True)
+
+                    p = doc.add_paragraph()
+                    add_colored_run(p, f"   解析：", bold=True)
+                    add_colored_run(p, item.get('explanation', ''), color_blue)
+                    doc.add_paragraph("")
+            else:
+                doc.add_paragraph("暂无具体修改建议。")
+
+            # 4.3 结构与总结
+            doc.add_heading("三、结构与整体总结", level=3)
+            doc.add_paragraph(f"结构评价：{fb.get('structure', '无')}")
+            doc.add_paragraph(f"整体总结：{fb.get('overall_summary', '无')}")
+
+            # 5. 范文
+            doc.add_heading("满分范文参考", level=2)
+            doc.add_paragraph(data.get('revised_version', '暂无'))
+
+            doc.add_page_break()
+
+        return doc
 
 # ==========================================
 # 前端 GUI
@@ -201,10 +488,36 @@ class EssayGraderApp(QMainWindow):
         
         # 核心：存储所有文件的结果 {filepath: json_data}
         self.results_store = {}
-        
+
+        # 已添加文件路径集合，O(1)判重
+        self._known_paths = set()
+
+        # 并发线程池：批改是网络IO密集，6并发可重叠等待时间
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thread_pool.setMaxThreadCount(6)
+
+        # 图片预处理进程池：解码/缩放并行跑满多核，不占用GUI进程的GIL
+        self.process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+        # 进度计数 (由信号槽在GUI线程更新，无需加锁)
+        self._total_count = 0
+        self._done_count = 0
+
+        # 流式输出缓冲 {filepath: [增量文本]}
+        self._stream_buffers = {}
+
+        # 运行中的 Worker 引用：信号投递完成前不让Python侧对象被回收
+        self._active_workers = set()
+
         self.init_ui()
 
     def init_ui(self):
+        # 菜单栏：缓存管理
+        tools_menu = self.menuBar().addMenu("工具")
+        clear_cache_action = QAction("清空缓存", self)
+        clear_cache_action.triggered.connect(self.clear_cache)
+        tools_menu.addAction(clear_cache_action)
+
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
         layout = QVBoxLayout(main_widget)
@@ -281,18 +594,35 @@ class EssayGraderApp(QMainWindow):
 
         self.setFont(QFont("Microsoft YaHei", 10))
 
+    def closeEvent(self, event):
+        self.process_pool.shutdown(wait=False)
+        super().closeEvent(event)
+
+    def clear_cache(self):
+        """删除本地批改缓存，下次将重新调用API"""
+        count = 0
+        if os.path.isdir(CACHE_DIR):
+            for name in os.listdir(CACHE_DIR):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(CACHE_DIR, name))
+                        count += 1
+                    except OSError:
+                        pass
+        QMessageBox.information(self, "缓存", f"已清理 {count} 条缓存记录。")
+
     def add_files(self):
         filters = "All Support (*.png *.jpg *.jpeg *.pdf);;Images (*.png *.jpg);;PDF (*.pdf)"
         files, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", filters)
-        if files:
-            for f in files:
-                # 检查是否已存在
-                items = [self.file_list.item(x).data(Qt.UserRole) for x in range(self.file_list.count())]
-                if f not in items:
-                    item_name = os.path.basename(f)
-                    list_item = self.file_list.addItem(item_name)
-                    # 将完整路径存入 item 数据
-                    self.file_list.item(self.file_list.count()-1).setData(Qt.UserRole, f)
+        for f in files:
+            # 集合判重，拖入上百文件也不卡
+            if f in self._known_paths:
+                continue
+            self._known_paths.add(f)
+            item = QListWidgetItem(os.path.basename(f))
+            # 将完整路径存入 item 数据
+            item.setData(Qt.UserRole, f)
+            self.file_list.addItem(item)
 
     def start_grading(self):
         if self.file_list.count() == 0: return
@@ -304,54 +634,83 @@ class EssayGraderApp(QMainWindow):
         
         self.btn_run.setEnabled(False)
         self.btn_export.setEnabled(False)
-        self.process_next_file(0, api_key, endpoint)
-
-    def process_next_file(self, index, api_key, endpoint):
-        if index >= self.file_list.count():
-            self.status_label.setText("所有文件处理完成")
-            self.progress_bar.setValue(100)
-            self.btn_run.setEnabled(True)
-            self.btn_export.setEnabled(True)
-            QMessageBox.information(self, "完成", "批改完成，现在可以导出Word了。")
-            return
 
-        item = self.file_list.item(index)
-        file_path = item.data(Qt.UserRole)
-        
-        # 如果已批改过，跳过
-        if file_path in self.results_store:
-            self.process_next_file(index + 1, api_key, endpoint)
+        # 收集未批改的文件，全部提交线程池并发处理
+        # 直接持有 item 引用，回调里不再按行号反查列表
+        pending = []
+        for index in range(self.file_list.count()):
+            item = self.file_list.item(index)
+            file_path = item.data(Qt.UserRole)
+            if file_path not in self.results_store:
+                pending.append((item, file_path))
+
+        if not pending:
+            self._on_all_done()
             return
 
-        self.file_list.setCurrentRow(index)
-        self.status_label.setText(f"正在处理: {os.path.basename(file_path)}")
-        self.progress_bar.setValue(int((index / self.file_list.count()) * 100))
-
-        self.worker = Worker(file_path, api_key, endpoint)
-        self.worker.finished.connect(lambda res, path: self.on_result(res, path, index, api_key, endpoint))
-        self.worker.error.connect(lambda err, path: self.on_error(err, path, index, api_key, endpoint))
-        self.worker.start()
-
-    def on_result(self, result, file_path, index, api_key, endpoint):
+        self._total_count = len(pending)
+        self._done_count = 0
+        self.progress_bar.setValue(0)
+        self.status_label.setText(f"并发批改中 (0/{self._total_count})...")
+
+        for item, file_path in pending:
+            worker = Worker(file_path, api_key, endpoint, self.process_pool)
+            # Qt队列信号自动切回GUI线程，槽内更新UI是安全的
+            worker.signals.finished.connect(lambda res, path, it=item: self.on_result(res, path, it))
+            worker.signals.error.connect(lambda err, path, it=item: self.on_error(err, path, it))
+            worker.signals.streaming.connect(self.on_streaming)
+            # 完成即释放引用，引用计数立刻归零
+            self._active_workers.add(worker)
+            worker.signals.finished.connect(lambda *_, w=worker: self._active_workers.discard(w))
+            worker.signals.error.connect(lambda *_, w=worker: self._active_workers.discard(w))
+            self.thread_pool.start(worker)
+
+    def _on_file_done(self):
+        """每个文件完成(成功或失败)后推进进度"""
+        self._done_count += 1
+        self.progress_bar.setValue(int((self._done_count / self._total_count) * 100))
+        self.status_label.setText(f"并发批改中 ({self._done_count}/{self._total_count})...")
+        if self._done_count >= self._total_count:
+            self._on_all_done()
+
+    def _on_all_done(self):
+        self.status_label.setText("所有文件处理完成")
+        self.progress_bar.setValue(100)
+        self.btn_run.setEnabled(True)
+        self.btn_export.setEnabled(True)
+        QMessageBox.information(self, "完成", "批改完成，现在可以导出Word了。")
+
+    def on_streaming(self, delta, file_path):
+        """模型边生成边回传，实时反馈避免长时间"假死"观感"""
+        buf = self._stream_buffers.setdefault(file_path, [])
+        buf.append(delta)
+        self.status_label.setText(
+            f"{os.path.basename(file_path)} 生成中: 已接收 {sum(len(s) for s in buf)} 字符...")
+        # 若当前选中的正是该文件，则在原文页实时预览
+        current = self.file_list.currentItem()
+        if current and current.data(Qt.UserRole) == file_path:
+            self.text_original.setPlainText("".join(buf))
+
+    def on_result(self, result, file_path, item):
+        self._stream_buffers.pop(file_path, None)
         # 存入字典
         self.results_store[file_path] = result
-        
+
         # 更新列表状态
-        self.file_list.item(index).setText(f"[√] {os.path.basename(file_path)}")
-        self.file_list.item(index).setForeground(QColor("green"))
-        
+        item.setText(f"[√] {os.path.basename(file_path)}")
+        item.setForeground(QColor("green"))
+
         # 展示当前
         self.display_result(result)
-        
-        # 继续下一个
-        self.process_next_file(index + 1, api_key, endpoint)
+        self._on_file_done()
 
-    def on_error(self, err, file_path, index, api_key, endpoint):
+    def on_error(self, err, file_path, item):
+        self._stream_buffers.pop(file_path, None)
         self.status_label.setText(f"错误: {err}")
-        self.file_list.item(index).setText(f"[X] {os.path.basename(file_path)}")
-        self.file_list.item(index).setForeground(QColor("red"))
-        # 出错不中断，继续下一个
-        self.process_next_file(index + 1, api_key, endpoint)
+        item.setText(f"[X] {os.path.basename(file_path)}")
+        item.setForeground(QColor("red"))
+        # 出错不中断，其余文件继续
+        self._on_file_done()
 
     def load_selected_result(self, item):
         """点击列表时回调"""
@@ -369,62 +728,20 @@ class EssayGraderApp(QMainWindow):
         self.text_original.setText(f"【类型】：{data.get('essay_type')}\n\n{data.get('recognized_text')}")
         # 范文
         self.text_revised.setText(data.get('revised_version'))
-        
-        # 深度反馈
-        scores = data.get('scores', {})
+
+        # 深度反馈：预编译模板一次渲染，模型文本自动转义
         fb = data.get('feedback_detail', {})
-        content_fb = fb.get('content', {})
         lang_fb = fb.get('language', {})
-        
-        html = f"""
-        <h2 style='color:#333'>总分：<span style='color:#E53935; font-size:24px'>{scores.get('total')}/15</span></h2>
-        
-        <table border='1' cellpadding='6' cellspacing='0' style='border-collapse:collapse; width:100%; border-color:#ddd;'>
-            <tr style='background-color:#f5f5f5'>
-                <th width='33%'>内容要点</th><th width='33%'>语言表达</th><th width='33%'>结构衔接</th>
-            </tr>
-            <tr>
-                <td align='center'>{scores.get('dim1_score')}/5</td>
-                <td align='center'>{scores.get('dim2_score')}/5</td>
-                <td align='center'>{scores.get('dim3_score')}/5</td>
-            </tr>
-        </table>
-
-        <h3 style='background-color:#E3F2FD; padding:5px'>一、内容要点</h3>
-        <ul>
-            <li><b>🔻 不足：</b> {content_fb.get('weakness', '无')}</li>
-            <li><b>💡 建议：</b> {content_fb.get('suggestion', '无')}</li>
-        </ul>
-
-        <h3 style='background-color:#FFF3E0; padding:5px'>二、语言表达 (逐句精改)</h3>
-        """
-        
-        corrections = lang_fb.get('sentence_corrections', [])
-        if corrections:
-            for idx, item in enumerate(corrections, 1):
-                html += f"""
-                <div style='margin-bottom:15px; border-bottom:1px dashed #ccc; padding-bottom:10px;'>
-                    <p style='margin:4px 0'><b>{idx}. 🔴 原句：</b> <span style='color:#555'>{item.get('original')}</span></p>
-                    <p style='margin:4px 0'><b>🟢 修改：</b> <span style='color:#2E7D32; font-weight:bold'>{item.get('revised')}</span></p>
-                    <p style='margin:4px 0; color:#1565C0'><b>📘 解析：</b> {item.get('explanation')}</p>
-                </div>
-                """
-        else:
-            html += "<p>暂无具体句子修改建议。</p>"
-            
-        html += f"""
-        <p><b>整体评价：</b> {lang_fb.get('general_comment', '')}</p>
-
-        <h3 style='background-color:#E8F5E9; padding:5px'>三、结构与衔接</h3>
-        <p>{fb.get('structure', '无')}</p>
-
-        <hr>
-        <p><b>🌟 整体总结：</b> {fb.get('overall_summary', '')}</p>
-        """
-        self.text_feedback.setHtml(html)
+        self.text_feedback.setHtml(_FEEDBACK_TMPL.render(
+            scores=data.get('scores', {}),
+            fb=fb,
+            content_fb=fb.get('content', {}),
+            lang_fb=lang_fb,
+            corrections=lang_fb.get('sentence_corrections', []),
+        ))
 
     # ==========================================
-    # 修复后的 Word 导出逻辑
+    # Word 导出 (后台线程 + 原子写入)
     # ==========================================
     def export_to_word(self):
         if not self.results_store:
@@ -435,99 +752,27 @@ class EssayGraderApp(QMainWindow):
         if not save_path:
             return
 
-        doc = Document()
-        
-        # --- 核心：设置中文字体 ---
-        style = doc.styles['Normal']
-        style.font.name = 'Times New Roman'
-        style.element.rPr.rFonts.set(qn('w:eastAsia'), 'Microsoft YaHei') 
-        # ------------------------
-
-        for file_path, data in self.results_store.items():
-            filename = os.path.basename(file_path)
-            
-            # 1. 标题
-            doc.add_heading(f"文件：{filename}", level=1)
-            
-            # 2. 原文
-            doc.add_heading("OCR 识别原文", level=2)
-            p = doc.add_paragraph(data.get('recognized_text', ''))
-            p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-            # 3. 评分表
-            doc.add_heading("评分详情", level=2)
-            scores = data.get('scores', {})
-            table = doc.add_table(rows=2, cols=4)
-            table.style = 'Table Grid'
-            hdr = table.rows[0].cells
-            hdr[0].text, hdr[1].text, hdr[2].text, hdr[3].text = '维度', '内容要点', '语言表达', '结构衔接'
-            
-            row = table.rows[1].cells
-            row[0].text = '得分'
-            row[1].text = str(scores.get('dim1_score', 0))
-            row[2].text = str(scores.get('dim2_score', 0))
-            row[3].text = str(scores.get('dim3_score', 0))
-            
-            total_p = doc.add_paragraph()
-            run = total_p.add_run(f"总分：{scores.get('total')}/15")
-            run.bold = True
-            run.font.color.rgb = RGBColor(255, 0, 0)
-            run.font.size = Pt(14)
-
-            # 4. 深度反馈
-            fb = data.get('feedback_detail', {})
-            
-            # 4.1 内容
-            doc.add_heading("一、内容要点", level=3)
-            content_fb = fb.get('content', {})
-            weakness = content_fb.get('weakness') if content_fb else "无"
-            suggestion = content_fb.get('suggestion') if content_fb else "无"
-            doc.add_paragraph(f"不足：{weakness}", style='List Bullet')
-            doc.add_paragraph(f"建议：{suggestion}", style='List Bullet')
-            
-            # 4.2 语言（逐句）
-            doc.add_heading("二、语言表达与逐句修改", level=3)
-            lang_fb = fb.get('language', {})
-            corrections = lang_fb.get('sentence_corrections', []) if lang_fb else []
-            
-            if corrections:
-                for i, item in enumerate(corrections, 1):
-                    p = doc.add_paragraph()
-                    p.add_run(f"{i}. 原句：").bold = True
-                    p.add_run(item.get('original', '')).font.color.rgb = RGBColor(100, 100, 100)
-                    
-                    p = doc.add_paragraph()
-                    p.add_run(f"   修改：").bold = True
-                    run_rev = p.add_run(item.get('revised', ''))
-                    run_rev.font.color.rgb = RGBColor(0, 128, 0)
-                    run_rev.bold = True
-                    
-                    p = doc.add_paragraph()
-                    p.add_run(f"   解析：").bold = True
-                    p.add_run(item.get('explanation', '')).font.color.rgb = RGBColor(0, 0, 255)
-                    doc.add_paragraph("") 
-            else:
-                doc.add_paragraph("暂无具体修改建议。")
-
-            # 4.3 结构与总结
-            doc.add_heading("三、结构与整体总结", level=3)
-            doc.add_paragraph(f"结构评价：{fb.get('structure', '无')}")
-            doc.add_paragraph(f"整体总结：{fb.get('overall_summary', '无')}")
-
-            # 5. 范文
-            doc.add_heading("满分范文参考", level=2)
-            doc.add_paragraph(data.get('revised_version', '暂无'))
-
-            doc.add_page_break()
-
-        try:
-            doc.save(save_path)
-            QMessageBox.information(self, "成功", f"报告已保存至：\n{save_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "保存失败", f"错误详情：{str(e)}\n可能是文件被占用。")
+        # lxml 序列化是CPU大头，放后台线程跑，导出期间界面不冻结
+        self.btn_export.setEnabled(False)
+        self.status_label.setText("正在导出Word...")
+        self._export_worker = ExportWorker(self.results_store, save_path)
+        self._export_worker.success.connect(self.on_export_done)
+        self._export_worker.failed.connect(self.on_export_error)
+        self._export_worker.start()
+
+    def on_export_done(self, save_path):
+        self.btn_export.setEnabled(True)
+        self.status_label.setText("导出完成")
+        QMessageBox.information(self, "成功", f"报告已保存至：\n{save_path}")
+
+    def on_export_error(self, err):
+        self.btn_export.setEnabled(True)
+        self.status_label.setText("导出失败")
+        QMessageBox.critical(self, "保存失败", f"错误详情：{err}\n可能是文件被占用。")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Windows 打包成 exe 后子进程必需
     app = QApplication(sys.argv)
     window = EssayGraderApp()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())